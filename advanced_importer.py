@@ -1,23 +1,42 @@
 import pandas as pd
+import numpy as np
+import openpyxl
+import re
 import warnings
 import io
-from importer import FileParser, categorize_expenses
+from importer import FileParser, categorize_expenses, EXCEL_ENGINE
 import db
 
+# Keywords that identify a table header row
+HEADER_KEYWORDS = ['תאריך', 'שם בית עסק', 'סכום', 'חיוב', 'פרטים', 'תיאור', 'date', 'amount', 'description']
+
+# Hebrew/English column names for each standard internal column
+COLUMN_CANDIDATES = {
+    'date': ['תאריך', 'date', 'taarich'],
+    'description': ['שם בית עסק', 'תיאור', 'פרטים', 'description', 'details', 'business'],
+    'amount': ['סכום', 'סכום חיוב', 'amount', 'price', 'debit']
+}
+
+# Compiled once at import so every cell/column check is a single regex search
+# instead of an any() loop over the keyword list
+HEADER_KEYWORD_SET = frozenset(HEADER_KEYWORDS)
+KEYWORD_RE = re.compile('|'.join(re.escape(k) for k in HEADER_KEYWORDS))
+CANDIDATE_TO_TARGET = {candidate: target for target, candidates in COLUMN_CANDIDATES.items()
+                       for candidate in candidates}
+CANDIDATE_RE = {target: re.compile('|'.join(re.escape(c) for c in candidates))
+                for target, candidates in COLUMN_CANDIDATES.items()}
+
+# Date formats tried in order: DD.MM.YY seen in the file (e.g., 01.01.26), then ISO dates
+DATE_FORMATS = ['%d.%m.%y', 'ISO8601']
+
+# Characters stripped from amount cells before numeric conversion
+AMOUNT_CLEAN_RE = re.compile(r'[₪,\s]')
+
 class AdvancedExcelParser(FileParser):
     def parse(self, file) -> pd.DataFrame:
         """
         Parses complex Excel files with Hebrew headers and disconnected tables.
         """
-        with warnings.catch_warnings():
-            warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
-            # Read the entire sheet without header to analyze structure
-            # Handle both file path (str) and file-like object
-            if isinstance(file, str):
-                df_raw = pd.read_excel(file, header=None)
-            else:
-                df_raw = pd.read_excel(file, header=None)
-
         # 1. Dynamic Table Detection - Find ALL tables
         tables = []
         
@@ -25,48 +44,95 @@ class AdvancedExcelParser(FileParser):
         # The file structure shows multiple tables (e.g., "עסקאות שטרם נקלטו" and "עסקאות למועד חיוב")
         # Each table has its own header row.
         
-        keywords = ['תאריך', 'שם בית עסק', 'סכום', 'חיוב', 'פרטים', 'תיאור', 'date', 'amount', 'description']
-        
-        current_header_idx = None
+        # Rows are streamed once; only the rows of the table currently being read are buffered
+        header = None
+        table_rows = []
         
-        for i in range(len(df_raw)):
-            row_values = df_raw.iloc[i].astype(str).str.strip().tolist()
-            match_count = sum(1 for val in row_values if any(k in val for k in keywords))
-            
-            if match_count >= 2:
-                # Found a header row
-                if current_header_idx is not None:
-                    # Process the previous table
-                    table_df = self._extract_table(df_raw, current_header_idx, i)
-                    if not table_df.empty:
-                        tables.append(table_df)
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
+            for _, row_values in self._iter_rows(file):
+                match_count = self._count_keyword_cells(row_values)
                 
-                current_header_idx = i
+                if match_count >= 2:
+                    # Found a header row, flush the previous table
+                    if header is not None:
+                        table = self._extract_table(header, table_rows)
+                        if len(table[0]):
+                            tables.append(table)
+                    
+                    header = row_values
+                    table_rows = []
+                elif header is not None:
+                    table_rows.append(row_values)
         
         # Process the last table
-        if current_header_idx is not None:
-            table_df = self._extract_table(df_raw, current_header_idx, len(df_raw))
-            if not table_df.empty:
-                tables.append(table_df)
+        if header is not None:
+            table = self._extract_table(header, table_rows)
+            if len(table[0]):
+                tables.append(table)
                 
         if not tables:
             raise ValueError("Could not find any valid transaction tables in the Excel file.")
             
-        # Concatenate all found tables
-        full_df = pd.concat(tables, ignore_index=True)
-        
-        return full_df[['date', 'description', 'amount']]
+        # Assemble all found tables column by column in a single allocation,
+        # keeping text in Arrow-backed buffers instead of one Python object per cell
+        dates, descriptions, amounts = zip(*tables)
+        full_df = pd.DataFrame({
+            'date': pd.to_datetime(np.concatenate(dates)),
+            'description': pd.array(np.concatenate(descriptions), dtype='string[pyarrow]'),
+            'amount': np.concatenate(amounts)
+        })
+        
+        return full_df
 
-    def _extract_table(self, df_raw, header_idx, end_idx):
+    def _count_keyword_cells(self, row_values):
         """
-        Extracts a single table given start (header) and end indices.
+        Counts the cells in a row that contain a header keyword.
         """
-        # Extract the slice
-        df_slice = df_raw.iloc[header_idx:end_idx].copy()
-        
-        # Set first row as header
-        df_slice.columns = df_slice.iloc[0]
-        df_slice = df_slice[1:]
+        match_count = 0
+        for val in row_values:
+            if val is None:
+                continue
+            cell = str(val).strip()
+            # Cells that are exactly a keyword are a hash lookup; only the rest need the substring search
+            if cell in HEADER_KEYWORD_SET or KEYWORD_RE.search(cell):
+                match_count += 1
+        return match_count
+
+    def _iter_rows(self, file):
+        """
+        Yields (row_idx, row_values) for the first sheet without loading it into a DataFrame.
+        """
+        # Handle both file path (str) and file-like object
+        file_name = file if isinstance(file, str) else getattr(file, 'name', '')
+        
+        if file_name.endswith('.xls'):
+            # openpyxl can't read legacy .xls, let pandas (calamine) load it and walk the rows
+            # Walk the underlying ndarray: vals[i] is a plain view, no per-row Series boxing
+            vals = pd.read_excel(file, header=None, dtype=object, engine=EXCEL_ENGINE).to_numpy(dtype=object, copy=False)
+            for row_idx in range(len(vals)):
+                yield row_idx, vals[row_idx]
+            return
+        
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        try:
+            # Always the first sheet, as pd.read_excel reads; workbook.active is whichever sheet was last selected
+            for row_idx, row_values in enumerate(workbook.worksheets[0].iter_rows(values_only=True)):
+                yield row_idx, row_values
+        finally:
+            workbook.close()
+
+    def _extract_table(self, header, rows):
+        """
+        Cleans a single table given its header row and data rows.
+        Returns (dates, descriptions, amounts) arrays of equal length.
+        """
+        # Build the frame directly with the header as columns, no header-row slicing.
+        # Rows from read_only sheets can be ragged, so pad/trim them to the header width.
+        columns = [str(x).strip() for x in header]
+        width = len(columns)
+        body = np.array([tuple(row[:width]) + (None,) * (width - len(row)) for row in rows], dtype=object).reshape(-1, width)
+        df_slice = pd.DataFrame(body, columns=columns, copy=False)
         
         # Map columns
         df_mapped = self._map_columns(df_slice)
@@ -76,44 +142,65 @@ class AdvancedExcelParser(FileParser):
         df_clean = df_mapped.dropna(subset=['date', 'amount'])
         
         # Ensure amount is numeric
-        # Remove currency symbols and commas
+        # Remove currency symbols, commas and whitespace in a single pass
         if 'amount' in df_clean.columns:
-            df_clean['amount'] = df_clean['amount'].astype(str).str.replace('₪', '').str.replace(',', '').str.strip()
+            df_clean['amount'] = df_clean['amount'].astype(str).str.replace(AMOUNT_CLEAN_RE, '', regex=True)
             df_clean['amount'] = pd.to_numeric(df_clean['amount'], errors='coerce')
             df_clean = df_clean.dropna(subset=['amount'])
         
         # Ensure date is datetime
         if 'date' in df_clean.columns:
-            # Handle DD.MM.YY format seen in the file (e.g., 01.01.26)
-            df_clean['date'] = pd.to_datetime(df_clean['date'], format='%d.%m.%y', errors='coerce')
+            # Try the known formats in order, each only on the values still unparsed,
+            # so other vendors' formats are not silently dropped as NaT
+            parsed = pd.Series(pd.NaT, index=df_clean.index, dtype='datetime64[ns]')
+            for date_format in DATE_FORMATS:
+                missing = parsed.isna()
+                if not missing.any():
+                    break
+                parsed.loc[missing] = pd.to_datetime(df_clean.loc[missing, 'date'], format=date_format, errors='coerce')
+            
+            # Last resort: let pandas guess each remaining text value, day first as on Israeli statements.
+            # Numbers are left as NaT: pandas would read them as epoch nanoseconds, not dates.
+            missing = parsed.isna() & df_clean['date'].map(lambda v: isinstance(v, str))
+            if missing.any():
+                parsed.loc[missing] = pd.to_datetime(df_clean.loc[missing, 'date'], format='mixed', dayfirst=True, errors='coerce')
+            
+            df_clean['date'] = parsed
             df_clean = df_clean.dropna(subset=['date'])
+        
+        # Tables without a description column still contribute their rows
+        if 'description' in df_clean.columns:
+            descriptions = df_clean['description'].to_numpy(dtype=object)
+        else:
+            descriptions = np.full(len(df_clean), None, dtype=object)
             
-        return df_clean
+        return (df_clean['date'].to_numpy(dtype='datetime64[ns]'), descriptions,
+                df_clean['amount'].to_numpy(dtype=np.float64))
 
     def _map_columns(self, df):
         """
         Maps Hebrew/English columns to standard internal names.
         """
-        col_map = {
-            'date': ['תאריך', 'date', 'taarich'],
-            'description': ['שם בית עסק', 'תיאור', 'פרטים', 'description', 'details', 'business'],
-            'amount': ['סכום', 'סכום חיוב', 'amount', 'price', 'debit']
-        }
-        
         final_cols = {}
         df.columns = df.columns.astype(str).str.strip()
         
-        for target, candidates in col_map.items():
-            for col in df.columns:
-                if col in candidates:
-                    final_cols[target] = col
-                    break
-            # If exact match not found, try partial match
-            if target not in final_cols:
-                for col in df.columns:
-                    if any(c in col for c in candidates):
-                        final_cols[target] = col
-                        break
+        # Single pass over the columns, recording the first exact and first partial match per target
+        exact_cols = {}
+        partial_cols = {}
+        for col in df.columns:
+            target = CANDIDATE_TO_TARGET.get(col)
+            if target is not None:
+                exact_cols.setdefault(target, col)
+            for target, candidate_re in CANDIDATE_RE.items():
+                if target not in partial_cols and candidate_re.search(col):
+                    partial_cols[target] = col
+        
+        # An exact match takes precedence, otherwise fall back to the partial match
+        for target in COLUMN_CANDIDATES:
+            if target in exact_cols:
+                final_cols[target] = exact_cols[target]
+            elif target in partial_cols:
+                final_cols[target] = partial_cols[target]
         
         if len(final_cols) < 3:
              # Fallback: if we have date and amount, we can maybe infer description or use a default
@@ -133,14 +220,13 @@ def process_file(file_path, api_key=None):
     parser = AdvancedExcelParser()
     df = parser.parse(file_path)
     
-    # Get categories for AI
-    categories_df = db.get_categories()
-    categories_list = categories_df['name'].tolist()
-    
     # Categorize
     if api_key:
+        # Get categories for AI, only when there is a key to categorize with
+        categories_df = db.get_categories()
+        categories_list = categories_df['name'].tolist()
         df = categorize_expenses(df, categories_list, api_key)
     else:
-        df['category'] = 'Uncategorized'
+        df['category'] = pd.array(['Uncategorized'] * len(df), dtype='string[pyarrow]')
         
     return df
\ No newline at end of file
@@ -2,14 +2,16 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 import db
-import logic
-import matplotlib.pyplot as plt
+import db_cached
 import utils
 import importer
 import advanced_importer
 
 st.set_page_config(page_title="Expense Tracker", layout="wide")
 
+MONTH_NAMES = ("January", "February", "March", "April", "May", "June",
+               "July", "August", "September", "October", "November", "December")
+
 def main():
     st.title("💰 Expense Tracker & Projection")
 
@@ -90,24 +92,22 @@ def show_main_app():
 def show_dashboard(user_id):
     st.header("Dashboard")
     
-    current_year = datetime.now().year
-    current_month = datetime.now().month
+    now = datetime.now()
+    current_year = now.year
+    current_month = now.month
     
     # Year Selection
     selected_year = st.sidebar.number_input("Year", min_value=2020, max_value=2030, value=current_year)
     
     # Month Selection
-    month_names = ["January", "February", "March", "April", "May", "June",
-                   "July", "August", "September", "October", "November", "December"]
-    selected_month_name = st.sidebar.selectbox("Month", month_names, index=current_month-1)
-    selected_month = month_names.index(selected_month_name) + 1
+    selected_month_name = st.sidebar.selectbox("Month", MONTH_NAMES, index=current_month-1)
+    selected_month = MONTH_NAMES.index(selected_month_name) + 1
 
     # Monthly Overview
     st.subheader(f"Monthly Overview ({selected_month_name} {selected_year})")
     
     # Income Section
-    monthly_income = db.get_monthly_income(user_id, selected_year, selected_month)
-    monthly_summary = logic.get_monthly_summary(user_id, selected_year, selected_month)
+    monthly_summary, monthly_income = db_cached.get_monthly_summary(user_id, selected_year, selected_month)
     total_monthly_spent = monthly_summary['monthly_spent'].sum() if not monthly_summary.empty else 0.0
     
     # Calculate percentages
@@ -126,42 +126,30 @@ def show_dashboard(user_id):
             st.info(f"🔥 Top Spending Category: **{top_category['name']}** (₪{top_category['monthly_spent']:,.2f})")
 
         # Charts Row
+        # Rendered client-side by Vega-Lite, which also handles Hebrew (BiDi) labels itself
         col_chart1, col_chart2 = st.columns(2)
         
         with col_chart1:
             st.subheader("Target vs Spent")
             # Bar Chart
-            fig, ax = plt.subplots()
-            # Fix Hebrew text for matplotlib
-            categories = monthly_summary['name'].apply(utils.fix_hebrew_text)
-            
-            x = range(len(categories))
-            width = 0.35
-            
-            ax.bar([i - width/2 for i in x], monthly_summary['avg_monthly_target'], width, label='Target')
-            ax.bar([i + width/2 for i in x], monthly_summary['monthly_spent'], width, label='Spent')
-            
-            ax.set_ylabel('Amount (NIS)')
-            ax.set_xticks(x)
-            ax.set_xticklabels(categories, rotation=45, ha='right')
-            ax.legend()
-            plt.tight_layout()
-            st.pyplot(fig)
+            target_vs_spent = monthly_summary.set_index('name')[['avg_monthly_target', 'monthly_spent']]
+            target_vs_spent = target_vs_spent.rename(columns={'avg_monthly_target': 'Target', 'monthly_spent': 'Spent'})
+            st.bar_chart(target_vs_spent, stack=False, x_label='Category', y_label='Amount (NIS)')
 
         with col_chart2:
             st.subheader("Expenses Distribution")
             # Pie Chart
             # Filter out zero expenses for cleaner pie chart
-            spent_summary = monthly_summary[monthly_summary['monthly_spent'] > 0].copy()
+            spent_summary = monthly_summary[monthly_summary['monthly_spent'] > 0]
             
             if not spent_summary.empty:
-                # Fix Hebrew text for pie chart labels
-                spent_summary['display_name'] = spent_summary['name'].apply(utils.fix_hebrew_text)
-                
-                fig_pie, ax_pie = plt.subplots()
-                ax_pie.pie(spent_summary['monthly_spent'], labels=spent_summary['display_name'], autopct='%1.1f%%', startangle=90)
-                ax_pie.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
-                st.pyplot(fig_pie)
+                st.vega_lite_chart(spent_summary[['name', 'monthly_spent']], {
+                    'mark': {'type': 'arc', 'tooltip': True},
+                    'encoding': {
+                        'theta': {'field': 'monthly_spent', 'type': 'quantitative', 'title': 'Spent'},
+                        'color': {'field': 'name', 'type': 'nominal', 'title': 'Category'}
+                    }
+                }, width="stretch")
             else:
                 st.info("No expenses recorded for this month yet.")
 
@@ -177,7 +165,7 @@ def show_dashboard(user_id):
 
     # Yearly Overview (Collapsed)
     with st.expander(f"View Yearly Overview ({selected_year})"):
-        projection_status = logic.get_projection_status(user_id, selected_year)
+        projection_status = db_cached.get_projection_status(user_id, selected_year)
         
         if not projection_status.empty:
             # Display metrics
@@ -186,7 +174,7 @@ def show_dashboard(user_id):
             remaining = total_projected - total_spent
             yearly_utilization = (total_spent / total_projected * 100) if total_projected > 0 else 0
             
-            yearly_income = db.get_yearly_income(user_id, selected_year)
+            yearly_income = db_cached.get_yearly_income(user_id, selected_year)
             net_savings = yearly_income - total_spent
             savings_rate = (net_savings / yearly_income * 100) if yearly_income > 0 else 0
             
@@ -212,9 +200,7 @@ def show_dashboard(user_id):
             }))
             
             # Chart
-            # Fix Hebrew text for chart
-            projection_status['display_name'] = projection_status['name'].apply(utils.fix_hebrew_text)
-            st.bar_chart(projection_status.set_index('display_name')[['year_projection', 'total_spent']])
+            st.bar_chart(projection_status.set_index('name')[['year_projection', 'total_spent']])
             
         else:
             st.info("No categories found. Please add categories first.")
@@ -222,38 +208,37 @@ def show_dashboard(user_id):
 def show_add_expense(user_id):
     st.header("Add New Expense")
     
-    categories_df = db.get_categories(user_id)
+    name_to_id = db.get_categories_dict(user_id)
     
-    if categories_df.empty:
+    if not name_to_id:
         st.warning("Please add categories first!")
         return
 
     with st.form("expense_form"):
-        category = st.selectbox("Category", categories_df['name'])
+        category = st.selectbox("Category", list(name_to_id))
         amount = st.number_input("Amount", min_value=0.01, step=0.01)
         
         col_date1, col_date2 = st.columns(2)
-        current_year = datetime.now().year
-        current_month = datetime.now().month
+        now = datetime.now()
+        current_year = now.year
+        current_month = now.month
         
         with col_date1:
             year = st.number_input("Year", min_value=2020, max_value=2030, value=current_year)
         with col_date2:
-            month_names = ["January", "February", "March", "April", "May", "June",
-                           "July", "August", "September", "October", "November", "December"]
-            month_name = st.selectbox("Month", month_names, index=current_month-1)
-            month = month_names.index(month_name) + 1
+            month_name = st.selectbox("Month", MONTH_NAMES, index=current_month-1)
+            month = MONTH_NAMES.index(month_name) + 1
             
         description = st.text_input("Description")
         
         submitted = st.form_submit_button("Add Expense")
         
         if submitted:
-            # Convert numpy int64 to native python int
-            category_id = int(categories_df[categories_df['name'] == category]['id'].values[0])
+            category_id = name_to_id[category]
             # Default to 1st of the month
             date_str = f"{year}-{month:02d}-01"
             db.add_expense(user_id, category_id, amount, date_str, description)
+            db_cached.clear()
             st.success("Expense added successfully!")
 
     st.subheader("Recent Expenses")
@@ -268,16 +253,15 @@ def show_add_income(user_id):
         amount = st.number_input("Amount", min_value=0.01, step=0.01)
         
         col_date1, col_date2 = st.columns(2)
-        current_year = datetime.now().year
-        current_month = datetime.now().month
+        now = datetime.now()
+        current_year = now.year
+        current_month = now.month
         
         with col_date1:
             year = st.number_input("Year", min_value=2020, max_value=2030, value=current_year)
         with col_date2:
-            month_names = ["January", "February", "March", "April", "May", "June",
-                           "July", "August", "September", "October", "November", "December"]
-            month_name = st.selectbox("Month", month_names, index=current_month-1)
-            month = month_names.index(month_name) + 1
+            month_name = st.selectbox("Month", MONTH_NAMES, index=current_month-1)
+            month = MONTH_NAMES.index(month_name) + 1
             
         source = st.text_input("Source (e.g., Salary, Bonus)")
         description = st.text_input("Description")
@@ -287,23 +271,24 @@ def show_add_income(user_id):
         
         if submitted:
             if is_recurring:
-                count = 0
-                for m in range(month, 13):
-                    date_str = f"{year}-{m:02d}-01"
-                    db.add_income(user_id, amount, date_str, description, source)
-                    count += 1
+                # One transaction for all the months instead of a commit per month
+                rows = [(amount, f"{year}-{m:02d}-01", description, source) for m in range(month, 13)]
+                db.add_income_bulk(user_id, rows)
+                count = len(rows)
+                db_cached.clear()
                 st.success(f"Income added successfully for {count} months!")
             else:
                 # Default to 1st of the month
                 date_str = f"{year}-{month:02d}-01"
                 db.add_income(user_id, amount, date_str, description, source)
+                db_cached.clear()
                 st.success("Income added successfully!")
 
     st.markdown("---")
     st.subheader("Manage Income")
     
     # Filter by year for management
-    manage_year = st.number_input("Filter by Year", min_value=2020, max_value=2030, value=datetime.now().year, key="manage_income_year")
+    manage_year = st.number_input("Filter by Year", min_value=2020, max_value=2030, value=current_year, key="manage_income_year")
     
     income_records = db.get_yearly_income_records(user_id, manage_year)
     
@@ -324,6 +309,7 @@ def show_add_income(user_id):
                 # Extract ID from the selected string
                 income_id = int(selected_income_str.split(':')[0])
                 if db.delete_income(user_id, income_id):
+                    db_cached.clear()
                     st.success("Income deleted successfully!")
                     st.rerun()
                 else:
@@ -334,6 +320,10 @@ def show_add_income(user_id):
 def show_import_expenses(user_id):
     st.header("Import Expenses from File")
     
+    # Fetch categories once per render as O(1) lookups for the review/save steps
+    name_to_id = db.get_categories_dict(user_id)
+    valid_names = set(name_to_id)
+    
     uploaded_file = st.file_uploader("Choose a CSV or Excel file", type=["csv", "xlsx", "xls"])
     
     if uploaded_file is not None:
@@ -360,23 +350,23 @@ def show_import_expenses(user_id):
                     # Categorize using cache
                     categorized_df = importer.categorize_expenses(df, user_id)
                     
-                    # Store in session state for review
-                    st.session_state['imported_expenses'] = categorized_df
+                    # Store in session state for review, as Arrow bytes rather than a live DataFrame
+                    st.session_state['imported_expenses_arrow'] = utils.df_to_arrow_bytes(categorized_df)
                     st.success("Processing complete! Please review below.")
                     
         except Exception as e:
             st.error(f"Error parsing file: {e}")
             
     # Review and Save Section
-    if 'imported_expenses' in st.session_state:
+    if 'imported_expenses_arrow' in st.session_state:
         st.subheader("Review and Save")
         
         edited_df = st.data_editor(
-            st.session_state['imported_expenses'],
+            utils.df_from_arrow_bytes(st.session_state['imported_expenses_arrow']),
             column_config={
                 "category": st.column_config.SelectboxColumn(
                     "Category",
-                    options=db.get_categories(user_id)['name'].tolist() + ["Uncategorized"],
+                    options=list(name_to_id) + ["Uncategorized"],
                     required=True
                 )
             },
@@ -384,33 +374,30 @@ def show_import_expenses(user_id):
         )
         
         if st.button("Save to Database"):
-            count = 0
-            categories_df = db.get_categories(user_id)
+            # Skip uncategorized or invalid categories
+            to_save = edited_df[(edited_df['category'] != "Uncategorized") & edited_df['category'].isin(valid_names)].copy()
+            to_save['category_id'] = to_save['category'].map(name_to_id)
             
-            for index, row in edited_df.iterrows():
-                # Skip uncategorized or invalid categories
-                if row['category'] == "Uncategorized" or row['category'] not in categories_df['name'].values:
-                    continue
-                    
-                category_id = int(categories_df[categories_df['name'] == row['category']]['id'].values[0])
-                
-                # Parse date (assuming generic parser returns standard format or trying best effort)
-                # For now, we'll try to parse common formats
-                try:
-                    date_obj = pd.to_datetime(row['date'])
-                    date_str = date_obj.strftime('%Y-%m-%d')
-                except:
-                    date_str = datetime.now().strftime('%Y-%m-%d') # Fallback
-                
-                db.add_expense(user_id, category_id, float(row['amount']), date_str, row['description'])
-                
-                # Update cache with manual selection
-                db.cache_category(user_id, row['description'], row['category'])
-                
-                count += 1
+            # Parse dates in one pass ('mixed' parses each value on its own, like the old per-row parse)
+            to_save['date_str'] = pd.to_datetime(to_save['date'], errors='coerce', format='mixed').dt.strftime('%Y-%m-%d')
+            to_save['date_str'] = to_save['date_str'].fillna(datetime.now().strftime('%Y-%m-%d')) # Fallback
+            to_save['amount'] = to_save['amount'].astype(float)
+            
+            # Missing descriptions in string columns are pd.NA, which sqlite can't bind; store them as NULL
+            descriptions = to_save['description'].astype(object).where(to_save['description'].notna(), None).tolist()
+            
+            # .tolist() hands sqlite native Python ints/floats instead of numpy scalars
+            db.add_expenses_bulk(user_id, zip(to_save['category_id'].tolist(), to_save['amount'].tolist(),
+                                              to_save['date_str'].tolist(), descriptions))
+            
+            # Update cache with manual selection
+            db.cache_categories_bulk(user_id, zip(descriptions, to_save['category'].tolist()))
+            db_cached.clear()
+            
+            count = len(to_save)
                 
             st.success(f"Successfully saved {count} expenses and updated cache!")
-            del st.session_state['imported_expenses']
+            del st.session_state['imported_expenses_arrow']
 
 def show_manage_categories(user_id):
     st.header("Manage Categories")
@@ -432,13 +419,14 @@ def show_manage_categories(user_id):
                 yearly_projection = int(amount * 12) if projection_type == "Monthly" else int(amount)
                 
                 if db.add_category(user_id, name, yearly_projection):
+                    db_cached.clear()
                     st.success(f"Category '{name}' added with yearly projection of ₪{yearly_projection:,}!")
                 else:
                     # If add fails, try to update
-                    cats = db.get_categories(user_id)
-                    if name in cats['name'].values:
-                        cat_id = cats[cats['name'] == name]['id'].values[0]
+                    cat_id = db.get_categories_dict(user_id).get(name)
+                    if cat_id is not None:
                         db.update_category_projection(user_id, cat_id, yearly_projection)
+                        db_cached.clear()
                         st.success(f"Category '{name}' updated with yearly projection of ₪{yearly_projection:,}!")
                     else:
                         st.error("Error adding category.")
@@ -446,7 +434,7 @@ def show_manage_categories(user_id):
                 st.error("Please enter a name.")
 
     st.subheader("Existing Categories")
-    categories = db.get_categories(user_id)
+    categories = db_cached.get_categories(user_id)
     if not categories.empty:
         st.dataframe(categories)
         
@@ -458,6 +446,7 @@ def show_manage_categories(user_id):
             
             if delete_submitted:
                 if db.delete_category(user_id, category_to_delete):
+                    db_cached.clear()
                     st.success(f"Category '{category_to_delete}' and its expenses deleted successfully!")
                     st.rerun()
                 else:
@@ -524,6 +513,7 @@ def show_backup_restore(user_id):
                     data_to_import['income'] = df[df['Type'] == 'Income'].drop(columns=['Type'])
                     
                     success, message = db.import_user_data(user_id, data_to_import)
+                    db_cached.clear()
                     
                     if success:
                         st.success(message)
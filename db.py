@@ -1,101 +1,201 @@
+import os
 import sqlite3
+import queue
+import threading
+from contextlib import contextmanager
 import pandas as pd
 from datetime import datetime
 import bcrypt
 
 DB_NAME = "expenses.db"
 
-def get_connection():
-    conn = sqlite3.connect(DB_NAME)
+# bcrypt cost factor for new password hashes (each step doubles hashing time).
+# verify_user always uses the cost stored in the hash, so existing users are unaffected.
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '10'))
+
+# Number of long-lived read connections kept in the pool
+READER_POOL_SIZE = 4
+
+# SQLite is single-writer/multi-reader: one dedicated writer connection plus a pool of readers.
+# Connections stay open across calls so each keeps its page cache warm.
+_writer_pool = None
+_reader_pool = None
+_pool_lock = threading.Lock()
+
+# Per-connection settings, applied to every pooled connection.
+# journal_mode=WAL is persistent in the database file and is set once in init_db.
+CONNECTION_PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-64000',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA foreign_keys=ON',
+)
+
+# Hot-path statements, kept as single constants so every call hands sqlite3 the exact same
+# string and hits its per-connection prepared statement cache
+INSERT_EXPENSE_SQL = 'INSERT INTO expenses (user_id, category_id, amount, date, description) VALUES (?, ?, ?, ?, ?)'
+INSERT_INCOME_SQL = 'INSERT INTO income (user_id, amount, date, description, source) VALUES (?, ?, ?, ?, ?)'
+# ON CONFLICT updates the existing row in place; INSERT OR REPLACE would delete and re-insert it
+UPSERT_CACHED_CATEGORY_SQL = '''
+    INSERT INTO expense_classification_cache (user_id, description, category_name) VALUES (?, ?, ?)
+    ON CONFLICT (user_id, description) DO UPDATE SET category_name = excluded.category_name
+'''
+
+def _connect():
+    # Pooled connections are handed to whichever Streamlit session thread asks next
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False, cached_statements=256)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
+def _init_pools():
+    global _writer_pool, _reader_pool
+    with _pool_lock:
+        if _writer_pool is None:
+            writer_pool = queue.Queue(maxsize=1)
+            writer_pool.put(_connect())
+            reader_pool = queue.Queue(maxsize=READER_POOL_SIZE)
+            for _ in range(READER_POOL_SIZE):
+                reader_pool.put(_connect())
+            _reader_pool = reader_pool
+            _writer_pool = writer_pool
+
+@contextmanager
+def get_connection(write=False):
+    """
+    Borrows a pooled connection for the duration of the with-block.
+    Pass write=True for anything that modifies the database.
+    """
+    if _writer_pool is None:
+        _init_pools()
+    pool = _writer_pool if write else _reader_pool
+    conn = pool.get()
+    try:
+        yield conn
+    finally:
+        # Never hand back a connection with a half-done transaction (e.g. after a caught IntegrityError)
+        if conn.in_transaction:
+            conn.rollback()
+        pool.put(conn)
+
 def init_db():
-    conn = get_connection()
-    c = conn.cursor()
-    
-    # Create users table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL
-        )
-    ''')
+    with get_connection(write=True) as conn:
+        c = conn.cursor()
+        
+        # WAL lets readers run alongside the writer; with synchronous=NORMAL commits don't fsync each time
+        c.execute('PRAGMA journal_mode=WAL')
+        
+        # Create users table
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL
+            )
+        ''')
 
-    # Create categories table with yearly projection and user_id
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS categories (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            name TEXT NOT NULL,
-            year_projection INTEGER NOT NULL DEFAULT 0,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            UNIQUE(user_id, name)
-        )
-    ''')
-    
-    # Create expenses table with user_id
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS expenses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            category_id INTEGER NOT NULL,
-            amount REAL NOT NULL,
-            date TEXT NOT NULL,
-            description TEXT,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (category_id) REFERENCES categories (id)
-        )
-    ''')
+        # Create categories table with yearly projection and user_id
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS categories (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                year_projection INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY (user_id) REFERENCES users (id),
+                UNIQUE(user_id, name)
+            )
+        ''')
+        
+        # Create expenses table with user_id
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS expenses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                category_id INTEGER NOT NULL,
+                amount REAL NOT NULL,
+                date TEXT NOT NULL,
+                description TEXT,
+                FOREIGN KEY (user_id) REFERENCES users (id),
+                FOREIGN KEY (category_id) REFERENCES categories (id)
+            )
+        ''')
 
-    # Create income table with user_id
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS income (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            amount REAL NOT NULL,
-            date TEXT NOT NULL,
-            description TEXT,
-            source TEXT,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
+        # Create income table with user_id
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS income (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                amount REAL NOT NULL,
+                date TEXT NOT NULL,
+                description TEXT,
+                source TEXT,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+        
+        # Create cache table for expense classification with user_id
+        # WITHOUT ROWID stores rows directly in the primary key B-tree, so a lookup is a single seek
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS expense_classification_cache (
+                user_id INTEGER NOT NULL,
+                description TEXT NOT NULL,
+                category_name TEXT NOT NULL,
+                PRIMARY KEY (user_id, description),
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            ) WITHOUT ROWID
+        ''')
+        _migrate_cache_without_rowid(c)
+        
+        # Composite indexes for the user_id + date range filters and ORDER BY date DESC.
+        # The expenses index also carries category_id and amount, so the SUM queries never touch the table.
+        # The classification cache needs none: its (user_id, description) primary key already serves lookups.
+        c.execute('CREATE INDEX IF NOT EXISTS idx_expenses_user_date ON expenses (user_id, date DESC, category_id, amount)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_income_user_date ON income (user_id, date DESC)')
+        
+        conn.commit()
+
+def _migrate_cache_without_rowid(c):
+    """Rebuilds an expense_classification_cache created before it became a WITHOUT ROWID table."""
+    c.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'expense_classification_cache'")
+    table_sql = c.fetchone()[0]
+    if 'WITHOUT ROWID' in table_sql.upper():
+        return
     
-    # Create cache table for expense classification with user_id
     c.execute('''
-        CREATE TABLE IF NOT EXISTS expense_classification_cache (
+        CREATE TABLE expense_classification_cache_new (
             user_id INTEGER NOT NULL,
             description TEXT NOT NULL,
             category_name TEXT NOT NULL,
             PRIMARY KEY (user_id, description),
             FOREIGN KEY (user_id) REFERENCES users (id)
-        )
+        ) WITHOUT ROWID
     ''')
-    
-    conn.commit()
-    conn.close()
+    c.execute('''
+        INSERT INTO expense_classification_cache_new (user_id, description, category_name)
+        SELECT user_id, description, category_name FROM expense_classification_cache
+    ''')
+    c.execute('DROP TABLE expense_classification_cache')
+    c.execute('ALTER TABLE expense_classification_cache_new RENAME TO expense_classification_cache')
 
 # --- Authentication ---
 
 def create_user(username, password):
-    conn = get_connection()
-    c = conn.cursor()
-    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-    try:
-        c.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)', (username, password_hash))
-        conn.commit()
-        return c.lastrowid
-    except sqlite3.IntegrityError:
-        return None
-    finally:
-        conn.close()
+    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS))
+    with get_connection(write=True) as conn:
+        c = conn.cursor()
+        try:
+            c.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)', (username, password_hash))
+            conn.commit()
+            return c.lastrowid
+        except sqlite3.IntegrityError:
+            return None
 
 def verify_user(username, password):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute('SELECT id, password_hash FROM users WHERE username = ?', (username,))
-    result = c.fetchone()
-    conn.close()
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('SELECT id, password_hash FROM users WHERE username = ?', (username,))
+        result = c.fetchone()
     
     if result:
         user_id, stored_hash = result
@@ -106,83 +206,98 @@ def verify_user(username, password):
 # --- Data Operations ---
 
 def add_category(user_id, name, year_projection):
-    conn = get_connection()
-    c = conn.cursor()
-    try:
-        c.execute('INSERT INTO categories (user_id, name, year_projection) VALUES (?, ?, ?)', (user_id, name, year_projection))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
-    finally:
-        conn.close()
+    with get_connection(write=True) as conn:
+        c = conn.cursor()
+        try:
+            c.execute('INSERT INTO categories (user_id, name, year_projection) VALUES (?, ?, ?)', (user_id, name, year_projection))
+            conn.commit()
+            return True
+        except sqlite3.IntegrityError:
+            return False
 
 def update_category_projection(user_id, category_id, year_projection):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute('UPDATE categories SET year_projection = ? WHERE id = ? AND user_id = ?', (year_projection, category_id, user_id))
-    conn.commit()
-    conn.close()
+    with get_connection(write=True) as conn:
+        c = conn.cursor()
+        c.execute('UPDATE categories SET year_projection = ? WHERE id = ? AND user_id = ?', (year_projection, category_id, user_id))
+        conn.commit()
 
 def delete_category(user_id, name):
-    conn = get_connection()
-    c = conn.cursor()
-    try:
-        # First get the category ID
-        c.execute('SELECT id FROM categories WHERE name = ? AND user_id = ?', (name, user_id))
-        result = c.fetchone()
-        if result:
-            category_id = result[0]
-            # Delete associated expenses first
-            c.execute('DELETE FROM expenses WHERE category_id = ? AND user_id = ?', (category_id, user_id))
-            # Then delete the category
-            c.execute('DELETE FROM categories WHERE id = ? AND user_id = ?', (category_id, user_id))
-            conn.commit()
-            return True
-        return False
-    except Exception as e:
-        print(f"Error deleting category: {e}")
-        return False
-    finally:
-        conn.close()
+    with get_connection(write=True) as conn:
+        c = conn.cursor()
+        try:
+            # First get the category ID
+            c.execute('SELECT id FROM categories WHERE name = ? AND user_id = ?', (name, user_id))
+            result = c.fetchone()
+            if result:
+                category_id = result[0]
+                # Delete associated expenses first
+                c.execute('DELETE FROM expenses WHERE category_id = ? AND user_id = ?', (category_id, user_id))
+                # Then delete the category
+                c.execute('DELETE FROM categories WHERE id = ? AND user_id = ?', (category_id, user_id))
+                conn.commit()
+                return True
+            return False
+        except Exception as e:
+            print(f"Error deleting category: {e}")
+            return False
 
 def add_expense(user_id, category_id, amount, date, description):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute('INSERT INTO expenses (user_id, category_id, amount, date, description) VALUES (?, ?, ?, ?, ?)', 
-              (user_id, category_id, amount, date, description))
-    conn.commit()
-    conn.close()
+    with get_connection(write=True) as conn:
+        c = conn.cursor()
+        c.execute(INSERT_EXPENSE_SQL, (user_id, category_id, amount, date, description))
+        conn.commit()
+
+def add_expenses_bulk(user_id, rows):
+    """Inserts (category_id, amount, date, description) rows in a single transaction."""
+    with get_connection(write=True) as conn:
+        c = conn.cursor()
+        c.executemany(INSERT_EXPENSE_SQL, ((user_id, *row) for row in rows))
+        conn.commit()
 
 def add_income(user_id, amount, date, description, source):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute('INSERT INTO income (user_id, amount, date, description, source) VALUES (?, ?, ?, ?, ?)',
-              (user_id, amount, date, description, source))
-    conn.commit()
-    conn.close()
+    with get_connection(write=True) as conn:
+        c = conn.cursor()
+        c.execute(INSERT_INCOME_SQL, (user_id, amount, date, description, source))
+        conn.commit()
 
-def delete_income(user_id, income_id):
-    conn = get_connection()
-    c = conn.cursor()
-    try:
-        c.execute('DELETE FROM income WHERE id = ? AND user_id = ?', (income_id, user_id))
+def add_income_bulk(user_id, rows):
+    """Inserts (amount, date, description, source) rows in a single transaction."""
+    with get_connection(write=True) as conn:
+        c = conn.cursor()
+        c.executemany(INSERT_INCOME_SQL, ((user_id, *row) for row in rows))
         conn.commit()
-        return True
-    except Exception as e:
-        print(f"Error deleting income: {e}")
-        return False
-    finally:
-        conn.close()
+
+def delete_income(user_id, income_id):
+    with get_connection(write=True) as conn:
+        c = conn.cursor()
+        try:
+            c.execute('DELETE FROM income WHERE id = ? AND user_id = ?', (income_id, user_id))
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error deleting income: {e}")
+            return False
+
+def _month_range(year, month):
+    """Half-open ['YYYY-MM-01', first day of next month) bounds, so date filters can use an index."""
+    start = f"{year}-{month:02d}-01"
+    end = f"{year + 1}-01-01" if month == 12 else f"{year}-{month + 1:02d}-01"
+    return start, end
+
+def _year_range(year):
+    """Half-open ['YYYY-01-01', 'YYYY+1-01-01') bounds."""
+    return f"{year}-01-01", f"{year + 1}-01-01"
 
 def get_categories(user_id):
-    conn = get_connection()
-    df = pd.read_sql_query("SELECT * FROM categories WHERE user_id = ?", conn, params=(user_id,))
-    conn.close()
-    return df
+    with get_connection() as conn:
+        return pd.read_sql_query("SELECT * FROM categories WHERE user_id = ?", conn, params=(user_id,))
+
+def get_categories_dict(user_id):
+    """Returns {name: id} for lookups that don't need the full categories DataFrame."""
+    with get_connection() as conn:
+        return dict(conn.execute('SELECT name, id FROM categories WHERE user_id = ? ORDER BY id', (user_id,)).fetchall())
 
 def get_expenses(user_id):
-    conn = get_connection()
     query = '''
         SELECT e.id, c.name as category, e.amount, e.date, e.description 
         FROM expenses e
@@ -190,116 +305,129 @@ def get_expenses(user_id):
         WHERE e.user_id = ?
         ORDER BY e.date DESC
     '''
-    df = pd.read_sql_query(query, conn, params=(user_id,))
-    conn.close()
-    return df
-
-def get_monthly_expenses(user_id, year, month):
-    conn = get_connection()
-    # Format month as 'YYYY-MM'
-    month_str = f"{year}-{month:02d}"
-    query = '''
-        SELECT c.name as category, SUM(e.amount) as total_spent
-        FROM expenses e
-        JOIN categories c ON e.category_id = c.id
-        WHERE e.user_id = ? AND strftime('%Y-%m', e.date) = ?
-        GROUP BY c.name
-    '''
-    df = pd.read_sql_query(query, conn, params=(user_id, month_str))
-    conn.close()
-    return df
+    with get_connection() as conn:
+        return pd.read_sql_query(query, conn, params=(user_id,))
 
 def get_yearly_expenses(user_id, year):
-    conn = get_connection()
-    year_str = str(year)
+    start, end = _year_range(year)
     query = '''
         SELECT c.name as category, SUM(e.amount) as total_spent
         FROM expenses e
         JOIN categories c ON e.category_id = c.id
-        WHERE e.user_id = ? AND strftime('%Y', e.date) = ?
+        WHERE e.user_id = ? AND e.date >= ? AND e.date < ?
         GROUP BY c.name
     '''
-    df = pd.read_sql_query(query, conn, params=(user_id, year_str))
-    conn.close()
-    return df
+    with get_connection() as conn:
+        return pd.read_sql_query(query, conn, params=(user_id, start, end))
 
-def get_monthly_income(user_id, year, month):
-    conn = get_connection()
-    month_str = f"{year}-{month:02d}"
-    query = '''
+def get_full_summary(user_id, year, month):
+    """
+    Returns (summary, monthly_income) for the dashboard from one connection:
+    every category with its yearly and monthly spend (0 when none), and the month's income total.
+    """
+    year_start, year_end = _year_range(year)
+    month_start, month_end = _month_range(year, month)
+    # Both sums are aggregated per category_id by SQLite (straight off idx_expenses_user_date)
+    # and joined onto the categories, so pandas only receives one row per category
+    summary_query = '''
+        SELECT c.id, c.user_id, c.name, c.year_projection,
+               COALESCE(y.total_spent, 0.0) as total_spent,
+               COALESCE(m.total_spent, 0.0) as monthly_spent
+        FROM categories c
+        LEFT JOIN (
+            SELECT category_id, SUM(amount) as total_spent
+            FROM expenses
+            WHERE user_id = ? AND date >= ? AND date < ?
+            GROUP BY category_id
+        ) y ON y.category_id = c.id
+        LEFT JOIN (
+            SELECT category_id, SUM(amount) as total_spent
+            FROM expenses
+            WHERE user_id = ? AND date >= ? AND date < ?
+            GROUP BY category_id
+        ) m ON m.category_id = c.id
+        WHERE c.user_id = ?
+        ORDER BY c.id
+    '''
+    income_query = '''
         SELECT SUM(amount) as total_income
         FROM income
-        WHERE user_id = ? AND strftime('%Y-%m', date) = ?
+        WHERE user_id = ? AND date >= ? AND date < ?
     '''
-    df = pd.read_sql_query(query, conn, params=(user_id, month_str))
-    conn.close()
-    return df.iloc[0]['total_income'] if not df.empty and df.iloc[0]['total_income'] is not None else 0.0
+    with get_connection() as conn:
+        summary = pd.read_sql_query(summary_query, conn, params=(user_id, year_start, year_end,
+                                                                 user_id, month_start, month_end, user_id))
+        row = conn.execute(income_query, (user_id, month_start, month_end)).fetchone()
+    return summary, (row[0] if row and row[0] is not None else 0.0)
 
 def get_yearly_income(user_id, year):
-    conn = get_connection()
-    year_str = str(year)
+    start, end = _year_range(year)
     query = '''
         SELECT SUM(amount) as total_income
         FROM income
-        WHERE user_id = ? AND strftime('%Y', date) = ?
+        WHERE user_id = ? AND date >= ? AND date < ?
     '''
-    df = pd.read_sql_query(query, conn, params=(user_id, year_str))
-    conn.close()
-    return df.iloc[0]['total_income'] if not df.empty and df.iloc[0]['total_income'] is not None else 0.0
+    with get_connection() as conn:
+        row = conn.execute(query, (user_id, start, end)).fetchone()
+    return row[0] if row and row[0] is not None else 0.0
 
 def get_income_records(user_id, year, month):
-    conn = get_connection()
-    month_str = f"{year}-{month:02d}"
+    start, end = _month_range(year, month)
     query = '''
         SELECT * FROM income
-        WHERE user_id = ? AND strftime('%Y-%m', date) = ?
+        WHERE user_id = ? AND date >= ? AND date < ?
         ORDER BY date DESC
     '''
-    df = pd.read_sql_query(query, conn, params=(user_id, month_str))
-    conn.close()
-    return df
+    with get_connection() as conn:
+        return pd.read_sql_query(query, conn, params=(user_id, start, end))
 
 def get_yearly_income_records(user_id, year):
-    conn = get_connection()
-    year_str = str(year)
+    start, end = _year_range(year)
     query = '''
         SELECT * FROM income
-        WHERE user_id = ? AND strftime('%Y', date) = ?
+        WHERE user_id = ? AND date >= ? AND date < ?
         ORDER BY date DESC
     '''
-    df = pd.read_sql_query(query, conn, params=(user_id, year_str))
-    conn.close()
-    return df
-
-def get_cached_category(user_id, description):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute('SELECT category_name FROM expense_classification_cache WHERE user_id = ? AND description = ?', (user_id, description))
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result else None
-
-def cache_category(user_id, description, category_name):
-    conn = get_connection()
-    c = conn.cursor()
-    try:
-        c.execute('INSERT OR REPLACE INTO expense_classification_cache (user_id, description, category_name) VALUES (?, ?, ?)', 
-                  (user_id, description, category_name))
-        conn.commit()
-    except Exception as e:
-        print(f"Error caching category: {e}")
-    finally:
-        conn.close()
+    with get_connection() as conn:
+        return pd.read_sql_query(query, conn, params=(user_id, start, end))
+
+# Descriptions bound per IN (...) query, well below SQLite's host parameter limit
+CACHE_LOOKUP_CHUNK = 500
+
+def get_cached_categories(user_id, descriptions):
+    """Returns {description: category_name} for the cached descriptions, one query per chunk."""
+    unique = list(set(descriptions))
+    cached = {}
+    with get_connection() as conn:
+        for i in range(0, len(unique), CACHE_LOOKUP_CHUNK):
+            chunk = unique[i:i + CACHE_LOOKUP_CHUNK]
+            query = f'''
+                SELECT description, category_name FROM expense_classification_cache
+                WHERE user_id = ? AND description IN ({','.join('?' * len(chunk))})
+            '''
+            cached.update(conn.execute(query, (user_id, *chunk)).fetchall())
+    return cached
+
+def cache_categories_bulk(user_id, pairs):
+    """Caches (description, category_name) pairs in a single transaction."""
+    with get_connection(write=True) as conn:
+        c = conn.cursor()
+        try:
+            # Rows without a description have nothing to key on (description is NOT NULL), skip them
+            # rather than failing the whole batch
+            c.executemany(UPSERT_CACHED_CATEGORY_SQL,
+                          ((user_id, description, category_name) for description, category_name in pairs
+                           if description is not None))
+            conn.commit()
+        except Exception as e:
+            print(f"Error caching categories: {e}")
 
 def export_user_data(user_id):
     """Exports all user data to a dictionary of DataFrames."""
-    conn = get_connection()
-    
-    categories = pd.read_sql_query("SELECT * FROM categories WHERE user_id = ?", conn, params=(user_id,))
-    expenses = pd.read_sql_query("SELECT * FROM expenses WHERE user_id = ?", conn, params=(user_id,))
-    income = pd.read_sql_query("SELECT * FROM income WHERE user_id = ?", conn, params=(user_id,))
-    
-    conn.close()
+    with get_connection() as conn:
+        categories = pd.read_sql_query("SELECT * FROM categories WHERE user_id = ? ORDER BY id", conn, params=(user_id,))
+        expenses = pd.read_sql_query("SELECT * FROM expenses WHERE user_id = ? ORDER BY id", conn, params=(user_id,))
+        income = pd.read_sql_query("SELECT * FROM income WHERE user_id = ? ORDER BY id", conn, params=(user_id,))
     
     return {
         "categories": categories,
@@ -309,58 +437,51 @@ def export_user_data(user_id):
 
 def import_user_data(user_id, data):
     """Imports user data from a dictionary of DataFrames."""
-    conn = get_connection()
-    c = conn.cursor()
-    
-    try:
-        # 1. Import Categories
-        if 'categories' in data and not data['categories'].empty:
-            for _, row in data['categories'].iterrows():
-                try:
-                    c.execute('INSERT INTO categories (user_id, name, year_projection) VALUES (?, ?, ?)',
-                              (user_id, row['name'], row['year_projection']))
-                except sqlite3.IntegrityError:
-                    # Category might already exist, update projection
-                    c.execute('UPDATE categories SET year_projection = ? WHERE user_id = ? AND name = ?',
-                              (row['year_projection'], user_id, row['name']))
-        
-        # Get updated category map (name -> id)
-        c.execute('SELECT name, id FROM categories WHERE user_id = ?', (user_id,))
-        cat_map = dict(c.fetchall())
+    with get_connection(write=True) as conn:
+        c = conn.cursor()
         
-        # 2. Import Expenses
-        if 'expenses' in data and not data['expenses'].empty:
-            for _, row in data['expenses'].iterrows():
-                # We need to map the category name to the new category ID
-                # The export might contain category_id which is invalid in the new context
-                # So we need to join with categories on export or rely on name if available.
-                # Since our export is raw table dump, expenses has category_id.
-                # We need to look up the category name from the exported categories df first.
+        try:
+            categories = data.get('categories')
+            
+            # 1. Import Categories
+            # Existing categories just get their projection updated
+            if categories is not None and not categories.empty:
+                c.executemany('''
+                    INSERT INTO categories (user_id, name, year_projection) VALUES (?, ?, ?)
+                    ON CONFLICT (user_id, name) DO UPDATE SET year_projection = excluded.year_projection
+                ''', [(user_id, name, year_projection) for name, year_projection
+                      in zip(categories['name'].tolist(), categories['year_projection'].tolist())])
+            
+            # Get updated category map (name -> id)
+            c.execute('SELECT name, id FROM categories WHERE user_id = ?', (user_id,))
+            cat_map = dict(c.fetchall())
+            
+            # 2. Import Expenses
+            if 'expenses' in data and not data['expenses'].empty:
+                expenses = data['expenses']
+                # Since our export is raw table dump, expenses has category_id, which is invalid in the new context.
+                # Map it through the exported categories to a name, then to the category ID in this database.
+                old_id_to_name = categories.set_index('id')['name'].to_dict() if categories is not None else {}
+                new_cat_ids = expenses['category_id'].map(old_id_to_name).map(cat_map)
+                valid = new_cat_ids.notna()
                 
-                # Find category name from exported data
-                cat_name = None
-                if 'categories' in data:
-                    cat_row = data['categories'][data['categories']['id'] == row['category_id']]
-                    if not cat_row.empty:
-                        cat_name = cat_row.iloc[0]['name']
-                
-                if cat_name and cat_name in cat_map:
-                    new_cat_id = cat_map[cat_name]
-                    c.execute('INSERT INTO expenses (user_id, category_id, amount, date, description) VALUES (?, ?, ?, ?, ?)',
-                              (user_id, new_cat_id, row['amount'], row['date'], row['description']))
-        
-        # 3. Import Income
-        if 'income' in data and not data['income'].empty:
-            for _, row in data['income'].iterrows():
-                c.execute('INSERT INTO income (user_id, amount, date, description, source) VALUES (?, ?, ?, ?, ?)',
-                          (user_id, row['amount'], row['date'], row['description'], row['source']))
-                          
-        conn.commit()
-        return True, "Data imported successfully!"
-    except Exception as e:
-        return False, f"Error importing data: {e}"
-    finally:
-        conn.close()
+                c.executemany(INSERT_EXPENSE_SQL,
+                              [(user_id, *row) for row in zip(new_cat_ids[valid].astype(int).tolist(),
+                                                              expenses.loc[valid, 'amount'].tolist(),
+                                                              expenses.loc[valid, 'date'].tolist(),
+                                                              expenses.loc[valid, 'description'].tolist())])
+            
+            # 3. Import Income
+            if 'income' in data and not data['income'].empty:
+                income = data['income']
+                c.executemany(INSERT_INCOME_SQL,
+                              [(user_id, *row) for row in zip(income['amount'].tolist(), income['date'].tolist(),
+                                                              income['description'].tolist(), income['source'].tolist())])
+                              
+            conn.commit()
+            return True, "Data imported successfully!"
+        except Exception as e:
+            return False, f"Error importing data: {e}"
 
 if __name__ == "__main__":
     init_db()
\ No newline at end of file
@@ -0,0 +1,29 @@
+import streamlit as st
+import db
+import logic
+
+# Cached read-side wrappers for the dashboard. Streamlit reruns the whole script on every
+# widget change, so these keep the same queries from hitting SQLite on each rerun.
+# Call clear() after any write so the next render sees fresh data.
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_categories(user_id):
+    return db.get_categories(user_id)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def get_yearly_income(user_id, year):
+    return db.get_yearly_income(user_id, year)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def get_monthly_summary(user_id, year, month):
+    return logic.get_monthly_summary(user_id, year, month)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def get_projection_status(user_id, year):
+    return logic.get_projection_status(user_id, year)
+
+def clear():
+    """Drops this module's cached reads so the next render reflects the latest writes."""
+    # Only these wrappers, not st.cache_data.clear(), which would wipe every cached function app-wide
+    for cached in (get_categories, get_yearly_income, get_monthly_summary, get_projection_status):
+        cached.clear()
@@ -1,6 +1,7 @@
 import pandas as pd
 import io
 import os
+import re
 from abc import ABC, abstractmethod
 from google import genai
 import json
@@ -10,6 +11,22 @@ import time
 import math
 import db
 
+# Rust-backed reader (python-calamine), several times faster than openpyxl and reads legacy .xls too
+EXCEL_ENGINE = 'calamine'
+
+# Column name substrings for each standard column, in priority order
+COLUMN_MAP = {
+    'date': ['date', 'taarich', 'time', 'תאריך'],
+    'description': ['description', 'desc', 'details', 'shem', 'name', 'תיאור', 'פרטים', 'בית עסק'],
+    'amount': ['amount', 'schum', 'price', 'cost', 'סכום', 'חיוב']
+}
+
+# Substrings that mark a cell as a likely column header: any of the mapped column names
+POTENTIAL_HEADERS = tuple(candidate for candidates in COLUMN_MAP.values() for candidate in candidates)
+
+# One case-insensitive alternation so each cell is a single regex search
+_HEADER_RE = re.compile('|'.join(map(re.escape, POTENTIAL_HEADERS)), re.IGNORECASE)
+
 # --- Strategy Pattern for File Parsing ---
 
 class FileParser(ABC):
@@ -27,33 +44,30 @@ class GenericParser(FileParser):
         if file.name.endswith('.csv'):
             df = pd.read_csv(file)
         elif file.name.endswith(('.xls', '.xlsx')):
-            # Suppress openpyxl warning about default style
-            with warnings.catch_warnings():
-                warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
-                # Read Excel file, skipping initial rows if necessary to find the header
-                # We'll try to read the first few rows and see if we can find the headers
-                df = pd.read_excel(file, header=None)
-                
-                # Find the header row
-                header_row_idx = None
-                for i in range(min(10, len(df))):
-                    row_values = df.iloc[i].astype(str).str.lower().tolist()
-                    # Check if this row contains potential headers
-                    matches = 0
-                    potential_headers = ['date', 'taarich', 'time', 'תאריך', 'description', 'desc', 'details', 'shem', 'name', 'תיאור', 'פרטים', 'בית עסק', 'amount', 'schum', 'price', 'cost', 'סכום', 'חיוב']
-                    for val in row_values:
-                        if any(h in val for h in potential_headers):
-                            matches += 1
-                    
-                    if matches >= 2: # If at least 2 headers match, assume this is the header row
-                        header_row_idx = i
-                        break
-                
-                if header_row_idx is not None:
-                    df = pd.read_excel(file, header=header_row_idx)
-                else:
-                    # Fallback to default read if no header found
-                    df = pd.read_excel(file)
+            # Read the whole sheet once; the header row is then located in memory
+            df = self._read_excel_raw(file)
+            
+            # Find the header row
+            # Count the cells containing a potential header in each of the first 10 rows, one column at a time
+            matches = df.head(10).apply(
+                lambda col: col.astype(str).str.contains(_HEADER_RE, na=False)
+            ).sum(axis=1)
+            
+            # If at least 2 headers match, assume this is the header row
+            header_rows = matches.index[matches >= 2]
+            header_row_idx = int(header_rows[0]) if len(header_rows) else None
+            
+            # Fallback to the first row if no header found
+            if header_row_idx is None:
+                header_row_idx = 0
+            
+            # Slice the header out of the sheet already in memory instead of parsing the workbook again.
+            # The raw columns are mixed object dtype; they are re-inferred once only the used ones are left.
+            # An empty sheet has no header row to slice; it falls through to the column check below
+            if not df.empty:
+                header = [str(x) for x in df.iloc[header_row_idx]]
+                df = df.iloc[header_row_idx + 1:].reset_index(drop=True)
+                df.columns = header
 
         else:
             raise ValueError("Unsupported file format. Please upload CSV or Excel file.")
@@ -62,29 +76,45 @@ class GenericParser(FileParser):
         df.columns = df.columns.astype(str).str.lower().str.strip()
         
         # Basic mapping attempt
-        col_map = {
-            'date': ['date', 'taarich', 'time', 'תאריך'],
-            'description': ['description', 'desc', 'details', 'shem', 'name', 'תיאור', 'פרטים', 'בית עסק'],
-            'amount': ['amount', 'schum', 'price', 'cost', 'סכום', 'חיוב']
-        }
-        
+        # For each target prefer a column named exactly like its highest-priority candidate (a set lookup),
+        # otherwise take the first column containing one, stopping at the first hit
+        cols = df.columns.tolist()
+        col_set = set(cols)
         final_cols = {}
-        for target, candidates in col_map.items():
-            for candidate in candidates:
-                # Exact match or partial match
-                matches = [c for c in df.columns if candidate in c]
-                if matches:
-                    final_cols[target] = matches[0]
-                    break
+        for target, candidates in COLUMN_MAP.items():
+            match = next((candidate for candidate in candidates if candidate in col_set), None)
+            if match is None:
+                match = next((c for candidate in candidates for c in cols if candidate in c), None)
+            if match is not None:
+                final_cols[target] = match
         
         if len(final_cols) < 3:
             # Debug info
             found = list(final_cols.keys())
-            missing = [k for k in col_map.keys() if k not in found]
+            missing = [k for k in COLUMN_MAP.keys() if k not in found]
             raise ValueError(f"Could not automatically identify columns: {', '.join(missing)}. Found: {', '.join(found)}. Available columns: {', '.join(df.columns)}")
             
-        df = df.rename(columns={v: k for k, v in final_cols.items()})
-        return df[['date', 'description', 'amount']]
+        # Keep only the three mapped columns before any per-column work, so wide statements
+        # don't pay dtype inference (as read_excel would) on columns that are never used
+        # (selected by position, so a repeated header name still yields a single column)
+        df = df.iloc[:, [cols.index(c) for c in final_cols.values()]]
+        df.columns = list(final_cols.keys())
+        return df[['date', 'description', 'amount']].infer_objects()
+
+    def _read_excel_raw(self, file):
+        """
+        Reads the first sheet with no header row, falling back to pandas' default engine if calamine fails.
+        """
+        try:
+            return pd.read_excel(file, header=None, engine=EXCEL_ENGINE)
+        except Exception:
+            # python-calamine missing or unable to read this workbook; retry with openpyxl (xlrd for .xls)
+            if hasattr(file, 'seek'):
+                file.seek(0)
+            # Suppress openpyxl warning about default style
+            with warnings.catch_warnings():
+                warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
+                return pd.read_excel(file, header=None)
 
 # --- LLM Categorization ---
 
@@ -92,10 +122,11 @@ def categorize_expenses(expenses_df, user_id):
     """
     Categorizes expenses based on cached descriptions for a specific user.
     """
-    # Check Cache
-    expenses_df['category'] = expenses_df['description'].apply(lambda x: db.get_cached_category(user_id, x))
-    
-    # Fill missing with "Uncategorized"
-    expenses_df['category'] = expenses_df['category'].fillna("Uncategorized")
+    # Check Cache for all distinct descriptions in one batched query, then broadcast back to every row
+    # (missing descriptions are skipped: pd.NA can't be bound as an SQL parameter)
+    unique_descriptions = expenses_df['description'].dropna().unique().tolist()
+    cached = db.get_cached_categories(user_id, unique_descriptions)
+    # Fill missing with "Uncategorized" before assigning, so the column is written once
+    expenses_df['category'] = expenses_df['description'].map(cached).fillna("Uncategorized")
     
     return expenses_df
\ No newline at end of file
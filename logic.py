@@ -2,6 +2,20 @@ import pandas as pd
 from datetime import datetime
 import db
 
+def _add_projection_columns(df):
+    """
+    Adds remaining_budget and monthly_allowance from year_projection and total_spent.
+    """
+    # Monthly run rate needed to stay on track, including the current month
+    months_remaining = 12 - datetime.now().month + 1
+    
+    # One chained assign: each step sees the columns computed before it
+    return df.assign(
+        total_spent=lambda d: d['total_spent'].fillna(0.0),
+        remaining_budget=lambda d: d['year_projection'] - d['total_spent'],
+        monthly_allowance=lambda d: d['remaining_budget'] / months_remaining if months_remaining > 0 else 0,
+    )
+
 def get_projection_status(user_id, year):
     """
     Calculates the status of expenses vs projection for each category.
@@ -13,46 +27,24 @@ def get_projection_status(user_id, year):
     if not yearly_expenses_df.empty:
         merged_df = pd.merge(categories_df, yearly_expenses_df, left_on='name', right_on='category', how='left')
     else:
-        merged_df = categories_df.copy()
-        merged_df['total_spent'] = 0.0
-        
-    merged_df['total_spent'] = merged_df['total_spent'].fillna(0.0)
+        merged_df = categories_df.assign(total_spent=0.0)
     
-    # Calculate remaining budget
-    merged_df['remaining_budget'] = merged_df['year_projection'] - merged_df['total_spent']
-    
-    # Calculate monthly run rate needed to stay on track
-    current_month = datetime.now().month
-    months_remaining = 12 - current_month + 1 # Including current month
-    
-    if months_remaining > 0:
-        merged_df['monthly_allowance'] = merged_df['remaining_budget'] / months_remaining
-    else:
-        merged_df['monthly_allowance'] = 0
-        
-    return merged_df
+    return _add_projection_columns(merged_df)
 
 def get_monthly_summary(user_id, year, month):
     """
     Get summary of expenses for a specific month compared to the average monthly allowance.
+    Returns (summary, monthly_income); both come from a single db.get_full_summary call.
     """
-    monthly_expenses = db.get_monthly_expenses(user_id, year, month)
-    projection_status = get_projection_status(user_id, year)
+    # Categories, yearly and monthly spend already joined (and zero-filled) by SQLite
+    summary, monthly_income = db.get_full_summary(user_id, year, month)
+    summary = _add_projection_columns(summary)
     
     # Calculate the ideal monthly spend based on yearly projection / 12
     # This is a simple average, not adjusting for seasonality or past overspending
-    projection_status['avg_monthly_target'] = projection_status['year_projection'] / 12
+    summary['avg_monthly_target'] = summary['year_projection'] / 12
+    summary = summary.rename(columns={'total_spent': 'yearly_spent'})
     
-    if not monthly_expenses.empty:
-        summary = pd.merge(projection_status, monthly_expenses, left_on='name', right_on='category', how='left')
-        # Rename total_spent from monthly_expenses to monthly_spent
-        summary = summary.rename(columns={'total_spent_y': 'monthly_spent', 'total_spent_x': 'yearly_spent'})
-    else:
-        summary = projection_status.copy()
-        summary['monthly_spent'] = 0.0
-        summary = summary.rename(columns={'total_spent': 'yearly_spent'})
-        
-    summary['monthly_spent'] = summary['monthly_spent'].fillna(0.0)
     summary['monthly_variance'] = summary['avg_monthly_target'] - summary['monthly_spent']
     
-    return summary
\ No newline at end of file
+    return summary, monthly_income
@@ -1,9 +1,23 @@
-import bidi.algorithm
+import pyarrow as pa
 
-def fix_hebrew_text(text):
+def df_to_arrow_bytes(df):
     """
-    Reverses Hebrew text for proper display in matplotlib charts.
+    Serializes a DataFrame to Arrow IPC stream bytes, a compact form for keeping it in session state.
     """
-    if not isinstance(text, str):
-        return text
-    return bidi.algorithm.get_display(text)
\ No newline at end of file
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        # Mixed-type object columns (e.g. raw Excel cells) can't be typed by Arrow, store them as text
+        object_cols = df.select_dtypes(include='object').columns
+        table = pa.Table.from_pandas(df.astype({col: str for col in object_cols}), preserve_index=False)
+    
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def df_from_arrow_bytes(data):
+    """
+    Rebuilds a DataFrame from bytes produced by df_to_arrow_bytes.
+    """
+    return pa.ipc.open_stream(data).read_all().to_pandas()